@@ -1,12 +1,21 @@
 import os
 import json
+import math
+import time
+import queue
+import random
+import threading
+import tiktoken
+import functools
+import numpy as np
 import pyarrow as pa
-from typing import List
+from typing import Dict, Iterator, List, Optional, Tuple
 from google import genai
-from openai import AzureOpenAI
+from openai import APIConnectionError, AzureOpenAI, InternalServerError, RateLimitError
 from dotenv import load_dotenv
 from concurrent.futures import ThreadPoolExecutor
 from interface.base_datastore import BaseDatastore, DataItem, SearchResult
+from util.http_client import HTTP_LIMITS, HTTP_TIMEOUT, get_http_client
 
 # Import LanceDB dependencies
 import lancedb
@@ -14,22 +23,147 @@ from lancedb.table import Table
 
 load_dotenv()
 
+VECTOR_DIMENSIONS = 1536
+
+
+def _build_schema(vector_dimensions: int) -> pa.Schema:
+    return pa.schema(
+        [
+            pa.field("vector", pa.list_(pa.float32(), vector_dimensions)),
+            pa.field("vector_bin", pa.list_(pa.uint8(), vector_dimensions // 8)),  # 1 bit per dimension
+            pa.field("content", pa.utf8()),
+            pa.field("source", pa.utf8()),
+            pa.field("metadata", pa.utf8()),  # JSON string for metadata
+        ]
+    )
+
+
+# Table schemas are built once per embedding size rather than on every reset and write.
+SCHEMA_1536 = _build_schema(VECTOR_DIMENSIONS)
+_SCHEMAS: Dict[int, pa.Schema] = {VECTOR_DIMENSIONS: SCHEMA_1536}
+
+
+@functools.lru_cache(maxsize=None)
+def _open_ai_client() -> AzureOpenAI:
+    """Shared Azure OpenAI embeddings client, created on first use so cached embeddings don't depend on a Datastore instance."""
+    return AzureOpenAI(
+        azure_deployment="text-embedding-3-small", 
+        api_version="2024-12-01-preview", 
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"), 
+        azure_endpoint="https://my-dna-openai.openai.azure.com/",
+        http_client=get_http_client(),
+        # Batch embeddings retry transient errors themselves (see Datastore._embed_with_retry), so the SDK must not as well.
+        max_retries=0,
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def _query_client() -> AzureOpenAI:
+    """Copy of the embeddings client for single queries, which have no retry loop of their own, with the SDK's default retries."""
+    return _open_ai_client().with_options(max_retries=2)
+
+
+@functools.lru_cache(maxsize=1024)
+def _embed(content: str, model: str, dimensions: int) -> Tuple[float, ...]:
+    """Embed a single content, caching the result so repeated queries skip the network round-trip."""
+    response = _query_client().embeddings.create(
+        input=content,
+        model=model,
+        dimensions=dimensions,
+    )
+    # Tuples are immutable, so callers can't corrupt the cached value.
+    return tuple(response.data[0].embedding)
+
+
 class Datastore(BaseDatastore):
 
     DB_PATH = "data/sample-lancedb"
     DB_TABLE_NAME = "rag-table"
+    EMBEDDING_MODEL = "text-embedding-3-small"
 
-    def __init__(self):
-        self.vector_dimensions = 1536
-        self.open_ai_client = AzureOpenAI(
-            azure_deployment="text-embedding-3-small", 
-            api_version="2024-12-01-preview", 
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"), 
-            azure_endpoint="https://my-dna-openai.openai.azure.com/"
-        )
-        self.gemini_client = genai.Client(api_key=os.getenv("GEMINI_API_KEY"))
+    # Azure OpenAI accepts up to 2048 inputs and 300k tokens per embeddings request.
+    EMBEDDING_BATCH_SIZE = 128
+    EMBEDDING_BATCH_MAX_TOKENS = 300_000
+    EMBEDDING_MAX_RETRIES = 5
+    # Rate limits, 5xx responses, timeouts (a subclass of APIConnectionError) and dropped connections are worth retrying.
+    EMBEDDING_RETRY_ERRORS = (RateLimitError, InternalServerError, APIConnectionError)
+    # Upper bound on a single retry wait, and on the jitter added to it so concurrent batches spread out.
+    EMBEDDING_MAX_RETRY_DELAY = 60.0
+    EMBEDDING_RETRY_JITTER = 1.0
+
+    # Rows written per merge_insert transaction, so large ingests don't become one huge transaction.
+    WRITE_BATCH_SIZE = 8192
+
+    # Below this many rows an exhaustive scan is fast and exact, so no ANN index is built.
+    INDEX_MIN_ROWS = 10_000
+    INDEX_NAME = "vector_idx"
+    BINARY_INDEX_NAME = "vector_bin_idx"
+    # Retrain the indexes once the table has grown by this factor since they were built;
+    # smaller appends are folded into the existing indexes by optimize().
+    INDEX_REBUILD_GROWTH = 2
+    DISTANCE_METRIC = "cosine"
+
+    # lancedb 0.24 validates minimum_nprobes against its default maximum of 20 before applying ours,
+    # so searches on an indexed table fail with any higher minimum.
+    MAX_MIN_NPROBES = 20
+
+    # How many binary candidates to fetch per requested result before reranking with FP32 vectors.
+    RERANK_OVERFETCH = 10
+    # How many IVF_PQ candidates per result to re-score with full vectors, so _distance is exact.
+    REFINE_FACTOR = 10
+
+    def __init__(
+        self,
+        max_concurrent_batches: int = 5,
+        nprobes: int = 20,
+        max_nprobes: int = 50,
+        binary_prefilter: bool = True,
+    ):
+        # lancedb panics when a query may probe more partitions than the index has. Indexes are only
+        # built from INDEX_MIN_ROWS rows, so they always have at least that many partitions.
+        if max_nprobes > self._num_partitions(self.INDEX_MIN_ROWS):
+            raise ValueError(
+                f"max_nprobes must be at most {self._num_partitions(self.INDEX_MIN_ROWS)}, got {max_nprobes}"
+            )
+        if not 1 <= nprobes <= min(self.MAX_MIN_NPROBES, max_nprobes):
+            raise ValueError(
+                f"nprobes must be between 1 and {min(self.MAX_MIN_NPROBES, max_nprobes)}, got {nprobes}"
+            )
+        self.max_concurrent_batches = max_concurrent_batches
+        self.nprobes = nprobes
+        self.max_nprobes = max_nprobes
+        self.binary_prefilter = binary_prefilter
+        self.vector_dimensions = VECTOR_DIMENSIONS
+        self._embed_kwargs = {"model": self.EMBEDDING_MODEL, "dimensions": self.vector_dimensions}
+        # API clients are created on first use, so commands like reset don't pay for them.
+        self._gemini_client: Optional[genai.Client] = None
         self.vector_db = lancedb.connect(self.DB_PATH)
         self.table: Table = self._get_table()
+        # Rows the current indexes were trained on, looked up lazily from the index stats.
+        self._indexed_rows: Optional[int] = None
+        # Looked up once here, then kept current by reset() and _build_index(), rather than per query.
+        self._binary_index = self._has_binary_index()
+
+    @property
+    def open_ai_client(self) -> AzureOpenAI:
+        return _open_ai_client()
+
+    @functools.cached_property
+    def encoding(self) -> tiktoken.Encoding:
+        # Loading the encoding may download it, so only pay for that when tokens are actually counted.
+        return tiktoken.encoding_for_model(self.EMBEDDING_MODEL)
+
+    @property
+    def gemini_client(self) -> genai.Client:
+        if self._gemini_client is None:
+            # google-genai can't share an httpx client, so give its own client the same HTTP/2 pool settings.
+            self._gemini_client = genai.Client(
+                api_key=os.getenv("GEMINI_API_KEY"),
+                http_options=genai.types.HttpOptions(
+                    client_args={"http2": True, "limits": HTTP_LIMITS, "timeout": HTTP_TIMEOUT},
+                ),
+            )
+        return self._gemini_client
 
     def reset(self) -> Table:
         # Drop the table if it exists
@@ -39,28 +173,15 @@ class Datastore(BaseDatastore):
             print("Unable to drop table. Assuming it doesn't exist.")
 
         # Create the new table.
-        schema = pa.schema(
-            [
-                pa.field("vector", pa.list_(pa.float32(), self.vector_dimensions)),
-                pa.field("content", pa.utf8()),
-                pa.field("source", pa.utf8()),
-                pa.field("metadata", pa.utf8()),  # JSON string for metadata
-            ]
-        )
-
-        self.vector_db.create_table(self.DB_TABLE_NAME, schema=schema)
+        self.vector_db.create_table(self.DB_TABLE_NAME, schema=self._schema())
         self.table = self.vector_db.open_table(self.DB_TABLE_NAME)
+        self._indexed_rows = None
+        self._binary_index = False
         print(f"✅ Table Reset/Created: {self.DB_TABLE_NAME} in {self.DB_PATH}")
         return self.table
 
     def get_vector(self, content: str) -> List[float]:
-        response = self.open_ai_client.embeddings.create(
-            input=content,
-            model="text-embedding-3-small",
-            dimensions=self.vector_dimensions,
-        )
-        embeddings = response.data[0].embedding
-        return embeddings
+        return list(_embed(content, **self._embed_kwargs))
 
     def get_vector_gemini(self, content: str) -> List[float]:
         response = self.gemini_client.models.embed_content(
@@ -72,45 +193,194 @@ class Datastore(BaseDatastore):
         return embedding_obj.values
 
     def add_items(self, items: List[DataItem]) -> None:
+        if not items:
+            return
 
-        # Convert items to entries in parallel (since it's network bound).
-        with ThreadPoolExecutor(max_workers=8) as executor:
-            entries = list(executor.map(self._convert_item_to_entry, items))
+        # Embed the next slice in a background thread while the current one is written.
+        # The queue is bounded, so at most two embedded slices wait in memory.
+        record_batches: queue.Queue = queue.Queue(maxsize=2)
+        stop = threading.Event()
+        producer = threading.Thread(
+            target=self._produce_record_batches, args=(items, record_batches, stop), daemon=True
+        )
+        producer.start()
 
-        self.table.merge_insert(
-            "source"
-        ).when_matched_update_all().when_not_matched_insert_all().execute(entries)
+        try:
+            while (batch := record_batches.get()) is not None:
+                if isinstance(batch, BaseException):
+                    raise batch
+                self.table.merge_insert(
+                    "source"
+                ).when_matched_update_all().when_not_matched_insert_all().execute(pa.Table.from_batches([batch]))
+        finally:
+            # If a write failed, stop the producer and unblock any pending put before joining it.
+            stop.set()
+            while True:
+                try:
+                    record_batches.get_nowait()
+                except queue.Empty:
+                    break
+            producer.join()
+        self._build_index()
 
     def search(self, query: str, top_k: int = 5) -> List[SearchResult]:
         vector = self.get_vector(query)
-        results = (
-            self.table.search(vector)
+        results = self._search_vector(vector, top_k)
+
+        # Read whole columns instead of materializing a dict per row.
+        return [
+            self._to_search_result(content, source, metadata, distance)
+            for content, source, metadata, distance in zip(
+                results.column("content").to_pylist(),
+                results.column("source").to_pylist(),
+                results.column("metadata").to_pylist(),
+                results.column("_distance").to_pylist(),
+            )
+        ]
+
+    def measure_recall(self, queries: List[str], top_k: int = 10) -> float:
+        """Compare the search path used by `search` against an exhaustive FP32 scan and return the mean recall@k."""
+        recalls = []
+        for query in queries:
+            vector = self.get_vector(query)
+            approximate = set(self._search_vector(vector, top_k).column("source").to_pylist())
+            exact = self._exact_sources(vector, top_k)
+            recalls.append(len(approximate & exact) / len(exact) if exact else 1.0)
+        recall = sum(recalls) / len(recalls) if recalls else 1.0
+        print(f"✅ Recall@{top_k} over {len(queries)} queries: {recall:.3f}")
+        return recall
+
+    def _search_vector(self, vector: List[float], top_k: int) -> pa.Table:
+        if self.binary_prefilter and self._binary_index:
+            return self._search_binary(vector, top_k)
+        # Always probe `nprobes` partitions, and up to `max_nprobes` only when those come back short of top_k.
+        return (
+            self.table.search(vector, vector_column_name="vector")
+            .distance_type(self.DISTANCE_METRIC)
+            .minimum_nprobes(self.nprobes)
+            .maximum_nprobes(self.max_nprobes)
+            .refine_factor(self.REFINE_FACTOR)
             .select(["content", "source", "metadata"])
             .limit(top_k)
-            .to_list()
+            .to_arrow()
+        )
+
+    def _search_binary(self, vector: List[float], top_k: int) -> pa.Table:
+        """Find candidates by Hamming distance over binary vectors, then rerank them with the FP32 vectors."""
+        query_vector = np.asarray(vector, dtype=np.float32)
+        candidates = (
+            self.table.search(np.packbits(query_vector > 0), vector_column_name="vector_bin")
+            .distance_type("hamming")
+            .minimum_nprobes(self.nprobes)
+            .maximum_nprobes(self.max_nprobes)
+            .select(["content", "source", "metadata", "vector"])
+            .limit(top_k * self.RERANK_OVERFETCH)
+            .to_arrow()
+        )
+        num_candidates = candidates.num_rows
+        if num_candidates == 0:
+            return candidates.drop_columns(["vector"])
+
+        # Score every candidate with a single matrix-vector product over L2-normalized vectors.
+        candidate_vectors = (
+            candidates.column("vector").combine_chunks().flatten().to_numpy()
+            .reshape(num_candidates, self.vector_dimensions)
+        )
+        candidate_vectors = candidate_vectors / np.linalg.norm(candidate_vectors, axis=1, keepdims=True)
+        scores = candidate_vectors @ (query_vector / np.linalg.norm(query_vector))
+
+        # Select the top_k without fully sorting, then order just those.
+        top = np.argpartition(-scores, top_k - 1)[:top_k] if top_k < num_candidates else np.arange(num_candidates)
+        top = top[np.argsort(-scores[top])]
+
+        # Report the cosine distance in place of the Hamming one, matching the non-binary search path.
+        return (
+            candidates.drop_columns(["vector", "_distance"])
+            .take(top)
+            .append_column("_distance", pa.array(1.0 - scores[top], type=pa.float32()))
+        )
+
+    def _has_binary_index(self) -> bool:
+        """Whether the Hamming index exists; below INDEX_MIN_ROWS (or on tables created before the
+        vector_bin column was added) the exact FP32 scan is both faster and more accurate."""
+        if "vector_bin" not in self.table.schema.names:
+            return False
+        return any(index.name == self.BINARY_INDEX_NAME for index in self.table.list_indices())
+
+    def _exact_sources(self, vector: List[float], top_k: int) -> set:
+        results = (
+            self.table.search(vector, vector_column_name="vector")
+            .distance_type(self.DISTANCE_METRIC)
+            .bypass_vector_index()
+            .select(["source"])
+            .limit(top_k)
+            .to_arrow()
         )
+        return set(results.column("source").to_pylist())
 
-        search_results = []
-        for result in results:
-            # Parse metadata JSON
+    @staticmethod
+    def _to_search_result(content: str, source: str, metadata_json: str, distance: float) -> SearchResult:
+        # Parse metadata JSON
+        metadata = {}
+        try:
+            if metadata_json:
+                metadata = json.loads(metadata_json)
+        except (json.JSONDecodeError, TypeError):
             metadata = {}
-            try:
-                if result.get("metadata"):
-                    metadata = json.loads(result.get("metadata"))
-            except (json.JSONDecodeError, TypeError):
-                metadata = {}
-            
-            search_result = SearchResult(
-                content=result.get("content", ""),
-                source=result.get("source", ""),
-                page_no=metadata.get("page_no"),
-                headings=metadata.get("headings"),
-                bbox=metadata.get("bbox"),
-                relevance_score=0.0  # Will be set by retriever with re-ranking
-            )
-            search_results.append(search_result)
-        
-        return search_results
+
+        return SearchResult(
+            content=content or "",
+            source=source or "",
+            page_no=metadata.get("page_no"),
+            headings=metadata.get("headings"),
+            bbox=metadata.get("bbox"),
+            relevance_score=1.0 - distance  # Cosine similarity, replaced by the retriever's re-ranking
+        )
+
+    def _build_index(self) -> None:
+        """(Re)build the IVF_PQ and binary Hamming indexes once the table is large enough to benefit from it."""
+        num_rows = self.table.count_rows()
+        if num_rows < self.INDEX_MIN_ROWS:
+            return
+
+        if self._indexed_rows is None:
+            stats = self.table.index_stats(self.INDEX_NAME)
+            self._indexed_rows = stats.num_indexed_rows if stats else 0
+        # Retraining is expensive, so only do it when the partitions are badly sized for the table.
+        if self._indexed_rows and num_rows < self._indexed_rows * self.INDEX_REBUILD_GROWTH:
+            self.table.optimize()
+            print(f"✅ Optimized {self.INDEX_NAME} and {self.BINARY_INDEX_NAME} over {num_rows} rows")
+            return
+
+        self.table.create_index(
+            metric=self.DISTANCE_METRIC,
+            vector_column_name="vector",
+            index_type="IVF_PQ",
+            num_partitions=self._num_partitions(num_rows),
+            num_sub_vectors=96,
+            replace=True,
+        )
+        self.table.create_index(
+            metric="hamming",
+            vector_column_name="vector_bin",
+            index_type="IVF_FLAT",
+            num_partitions=self._num_partitions(num_rows),
+            replace=True,
+        )
+        self.table.wait_for_index([self.INDEX_NAME, self.BINARY_INDEX_NAME])
+        self._indexed_rows = num_rows
+        self._binary_index = True
+        print(f"✅ Built {self.INDEX_NAME} and {self.BINARY_INDEX_NAME} over {num_rows} rows")
+
+    @staticmethod
+    def _num_partitions(num_rows: int) -> int:
+        return max(1, int(math.sqrt(num_rows)))
+
+    def _schema(self) -> pa.Schema:
+        schema = _SCHEMAS.get(self.vector_dimensions)
+        if schema is None:
+            schema = _SCHEMAS[self.vector_dimensions] = _build_schema(self.vector_dimensions)
+        return schema
 
     def _get_table(self) -> Table:
         try:
@@ -119,13 +389,105 @@ class Datastore(BaseDatastore):
             print(f"Error opening table. Try resetting the datastore: {e}")
             return self.reset()
 
-    def _convert_item_to_entry(self, item: DataItem) -> dict:
-        """Convert a DataItem to match table schema."""
-        vector = self.get_vector(item.content)
-        metadata_json = json.dumps(item.metadata) if item.metadata else "{}"
-        return {
-            "vector": vector,
-            "content": item.content,
-            "source": item.source,
-            "metadata": metadata_json,
-        }
+    def _produce_record_batches(
+        self, items: List[DataItem], record_batches: queue.Queue, stop: threading.Event
+    ) -> None:
+        """Put one RecordBatch per write slice on the queue, then None (or the exception that stopped it).
+
+        Returns early once `stop` is set, i.e. when the consumer has given up.
+        """
+        try:
+            for start in range(0, len(items), self.WRITE_BATCH_SIZE):
+                if stop.is_set():
+                    return
+                record_batches.put(self._to_record_batch(items[start:start + self.WRITE_BATCH_SIZE]))
+            record_batches.put(None)
+        except BaseException as e:
+            if not stop.is_set():
+                record_batches.put(e)
+
+    def _to_record_batch(self, items: List[DataItem]) -> pa.RecordBatch:
+        contents = [item.content for item in items]
+        sources = [item.source for item in items]
+        metadata = [json.dumps(item.metadata) if item.metadata else "{}" for item in items]
+
+        # Embed all contents with as few requests as possible (since it's network bound).
+        vectors = self._embed_batch(contents)
+
+        # Build the Arrow columns directly rather than a dict per row.
+        return pa.RecordBatch.from_arrays(
+            [
+                pa.FixedSizeListArray.from_arrays(pa.array(vectors.reshape(-1)), self.vector_dimensions),
+                pa.FixedSizeListArray.from_arrays(
+                    pa.array(np.packbits(vectors > 0, axis=1).reshape(-1)), self.vector_dimensions // 8
+                ),
+                pa.array(contents, type=pa.utf8()),
+                pa.array(sources, type=pa.utf8()),
+                pa.array(metadata, type=pa.utf8()),
+            ],
+            schema=self._schema(),
+        )
+
+    def _embed_batch(self, contents: List[str]) -> np.ndarray:
+        """Embed many contents into an (N, dimensions) array, sending a bounded number of batch requests concurrently."""
+        vectors = np.empty((len(contents), self.vector_dimensions), dtype=np.float32)
+
+        def embed_into(batch: Tuple[int, List[str]]) -> None:
+            start, batch_contents = batch
+            vectors[start:start + len(batch_contents)] = self._embed_with_retry(batch_contents)
+
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_batches) as executor:
+            # Consume the iterator so that any exception raised by a worker is propagated.
+            list(executor.map(embed_into, self._batched(contents)))
+        return vectors
+
+    def _embed_with_retry(self, contents: List[str]) -> List[List[float]]:
+        """Embed a single batch, backing off with jitter when the API is rate limited or fails transiently."""
+        for attempt in range(self.EMBEDDING_MAX_RETRIES + 1):
+            try:
+                response = self.open_ai_client.embeddings.create(
+                    input=contents,
+                    **self._embed_kwargs,
+                )
+                break
+            except self.EMBEDDING_RETRY_ERRORS as e:
+                if attempt == self.EMBEDDING_MAX_RETRIES:
+                    raise
+                time.sleep(self._retry_delay(e, attempt))
+
+        # The API doesn't guarantee ordering, so restore it using each embedding's index.
+        return [data.embedding for data in sorted(response.data, key=lambda d: d.index)]
+
+    @classmethod
+    def _retry_delay(cls, error: Exception, attempt: int) -> float:
+        """Honour the Retry-After header if present, otherwise use exponential backoff."""
+        # Connection errors and timeouts have no response to read the header from.
+        response = getattr(error, "response", None)
+        try:
+            delay = float(response.headers.get("retry-after"))
+        except (AttributeError, TypeError, ValueError):
+            delay = 2.0 ** attempt
+        # Add a little jitter so that concurrent batches don't all retry at the same moment.
+        return min(delay, cls.EMBEDDING_MAX_RETRY_DELAY) + random.uniform(0, cls.EMBEDDING_RETRY_JITTER)
+
+    def _count_tokens(self, contents: List[str]) -> Iterator[int]:
+        """Count tokens with tiktoken's multi-threaded native encoder, a group of contents at a time."""
+        num_threads = os.cpu_count() or 1
+        for start in range(0, len(contents), self.EMBEDDING_BATCH_SIZE):
+            group = contents[start:start + self.EMBEDDING_BATCH_SIZE]
+            yield from (len(tokens) for tokens in self.encoding.encode_ordinary_batch(group, num_threads=num_threads))
+
+    def _batched(self, contents: List[str]) -> Iterator[Tuple[int, List[str]]]:
+        """Split contents into (start index, batch) pairs that respect the size and token limits of a request."""
+        start, batch, batch_tokens = 0, [], 0
+        for i, (content, tokens) in enumerate(zip(contents, self._count_tokens(contents))):
+            if batch and (
+                len(batch) >= self.EMBEDDING_BATCH_SIZE
+                or batch_tokens + tokens > self.EMBEDDING_BATCH_MAX_TOKENS
+            ):
+                yield start, batch
+                start, batch, batch_tokens = i, [], 0
+            batch.append(content)
+            batch_tokens += tokens
+        if batch:
+            yield start, batch
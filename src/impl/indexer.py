@@ -1,38 +1,109 @@
 import os
 import tiktoken
-from typing import List
+import functools
+import multiprocessing
+from typing import Iterable, List, Optional
+from concurrent.futures import ProcessPoolExecutor
 from interface.base_datastore import DataItem
 from interface.base_indexer import BaseIndexer
 from docling.chunking import HybridChunker, DocChunk
-from docling.document_converter import DocumentConverter
-from docling_core.transforms.chunker.tokenizer.openai import OpenAITokenizer
+from docling.datamodel.accelerator_options import AcceleratorOptions
+from docling.datamodel.base_models import InputFormat
+from docling.datamodel.pipeline_options import PdfPipelineOptions
+from docling.document_converter import DocumentConverter, ImageFormatOption, PdfFormatOption
+from util.tokenizer import StreamingOpenAITokenizer
+
+# Converter and chunker owned by each worker process, created once by _init_worker.
+_worker_converter: Optional[DocumentConverter] = None
+_worker_chunker: Optional[HybridChunker] = None
+
+
+def _create_chunker() -> HybridChunker:
+    tokenizer = StreamingOpenAITokenizer(tokenizer=tiktoken.encoding_for_model("gpt-4o"), max_tokens=128 * 1024)
+    return HybridChunker(tokenizer=tokenizer, max_tokens=8192)
+
+
+def _create_worker_converter() -> DocumentConverter:
+    # Every worker loads its own docling models, so each runs them on one thread rather than oversubscribing the CPU.
+    pipeline_options = PdfPipelineOptions(accelerator_options=AcceleratorOptions(num_threads=1))
+    return DocumentConverter(
+        format_options={
+            InputFormat.PDF: PdfFormatOption(pipeline_options=pipeline_options),
+            InputFormat.IMAGE: ImageFormatOption(pipeline_options=pipeline_options),
+        }
+    )
+
+
+def _init_worker() -> None:
+    global _worker_converter, _worker_chunker
+    # Disable tokenizers parallelism to avoid OOM errors.
+    os.environ["TOKENIZERS_PARALLELISM"] = "false"
+    os.environ["OMP_NUM_THREADS"] = "1"
+    _worker_converter = _create_worker_converter()
+    _worker_chunker = _create_chunker()
+
+
+def _index_one(document_path: str) -> List[DataItem]:
+    """Index a single document in a worker process (module-level so that it can be pickled)."""
+    return _index_document(_worker_converter, _worker_chunker, document_path)
+
+
+def _index_document(converter: DocumentConverter, chunker: HybridChunker, document_path: str) -> List[DataItem]:
+    document = converter.convert(document_path).document
+    # Chunks are generated lazily, so each one is turned into an item as soon as it's produced.
+    chunks: Iterable[DocChunk] = chunker.chunk(document)
+    return Indexer._items_from_chunks(chunks)
+
 
 class Indexer(BaseIndexer):
-    def __init__(self):
-        self.converter = DocumentConverter()
-        
-        tokenizer = OpenAITokenizer(tokenizer=tiktoken.encoding_for_model("gpt-4o"), max_tokens=128 * 1024)
-        self.chunker = HybridChunker(tokenizer=tokenizer, max_tokens=8192)
+    def __init__(self, max_workers: Optional[int] = None):
+        self.max_workers = max_workers or os.cpu_count() or 1
         
         # Disable tokenizers parallelism to avoid OOM errors.
         os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
+    # The in-process converter and chunker are only needed when indexing without worker processes,
+    # so they're created on first use rather than alongside the workers' own copies.
+    @functools.cached_property
+    def converter(self) -> DocumentConverter:
+        return DocumentConverter()
+
+    @functools.cached_property
+    def chunker(self) -> HybridChunker:
+        return _create_chunker()
+
     def index(self, document_paths: List[str]) -> List[DataItem]:
+        # A single document isn't worth the cost of starting worker processes.
+        if len(document_paths) <= 1 or self.max_workers <= 1:
+            items = []
+            for document_path in document_paths:
+                items.extend(_index_document(self.converter, self.chunker, document_path))
+            return items
+
+        # Convert documents in parallel processes (since docling parsing is CPU bound).
         items = []
-        for document_path in document_paths:
-            document = self.converter.convert(document_path).document
-            chunks: List[DocChunk] = self.chunker.chunk(document)
-            items.extend(self._items_from_chunks(chunks))
+        max_workers = min(self.max_workers, len(document_paths))
+        # Spawn rather than fork: by now the parent runs lancedb's and httpx's threads, which forked children can deadlock on.
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            for document_items in executor.map(_index_one, document_paths):
+                items.extend(document_items)
         return items
 
-    def _items_from_chunks(self, chunks: List[DocChunk]) -> List[DataItem]:
+    @staticmethod
+    def _items_from_chunks(chunks: Iterable[DocChunk]) -> List[DataItem]:
         items = []
         for i, chunk in enumerate(chunks):
+            meta = chunk.meta
+            headings = meta.headings
+            origin_filename = meta.origin.filename if meta.origin else None
+
             # Extract page and location info
             page_no = None
             bbox = None
-            if chunk.meta.doc_items and chunk.meta.doc_items[0].prov:
-                prov = chunk.meta.doc_items[0].prov[0]
+            if meta.doc_items and meta.doc_items[0].prov:
+                prov = meta.doc_items[0].prov[0]
                 page_no = prov.page_no
                 bbox = prov.bbox.__dict__ if prov.bbox else None
             
@@ -40,20 +111,20 @@ class Indexer(BaseIndexer):
             metadata = {
                 "page_no": page_no,
                 "bbox": bbox,
-                "headings": chunk.meta.headings,
+                "headings": headings,
                 "chunk_index": i,
-                "filename": chunk.meta.origin.filename if chunk.meta.origin else None
+                "filename": origin_filename
             }
 
             # Enrich the chunk
-            content_headings = "## " + ", ".join(chunk.meta.headings) if chunk.meta.headings else ""
-            content_text = f"{content_headings}\n{chunk.text}" if content_headings else chunk.text
+            content_text = f"## {', '.join(headings)}\n{chunk.text}" if headings else chunk.text
             
             # Enhanced source string with page info
-            filename = chunk.meta.origin.filename if chunk.meta.origin else "unknown"
+            filename = origin_filename if meta.origin else "unknown"
             source = f"{filename}:page_{page_no}:chunk_{i}" if page_no is not None else f"{filename}:chunk_{i}"
             
-            item = DataItem(
+            # The fields are built above with the right types, so skip Pydantic validation.
+            item = DataItem.model_construct(
                 content=content_text,
                 source=source,
                 metadata=metadata
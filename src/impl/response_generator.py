@@ -9,6 +9,11 @@ Use the provided context to provide a concise answer to the user's question.
 If you cannot find the answer in the context, say so. Do not make up information.
 """
 
+CITATION_TEMPLATE = "\n{i}. Document: {filename}{page_info}{section_info}{score_info}\n   Text: \"{display_content}\""
+
+# Flattens content onto a single line in one pass.
+_NEWLINES_TO_SPACES = str.maketrans({"\n": " ", "\r": " "})
+
 
 class ResponseGenerator(BaseResponseGenerator):
     def generate_response(self, query: str, search_results: List[SearchResult]) -> str:
@@ -33,7 +38,7 @@ class ResponseGenerator(BaseResponseGenerator):
         """Format the response with detailed source citations."""
         
         # Create source citations
-        sources_section = "\n\nSources Used:"
+        citations = []
         for i, result in enumerate(search_results, 1):
             # Extract filename from source
             filename = result.source.split(':')[0] if result.source else "Unknown Document"
@@ -49,14 +54,18 @@ class ResponseGenerator(BaseResponseGenerator):
             # Format relevance score
             score_info = f" (Relevance: {result.relevance_score:.3f})" if result.relevance_score > 0 else ""
             
-            # Truncate content for display (first 150 characters)
-            display_content = result.content[:150] + "..." if len(result.content) > 150 else result.content
-            display_content = display_content.replace('\n', ' ')  # Single line
+            # Truncate content for display (first 150 characters) on a single line
+            display_content = result.content[:150].translate(_NEWLINES_TO_SPACES)
+            if len(result.content) > 150:
+                display_content += "..."
             
-            citation = (
-                f"\n{i}. Document: {filename}{page_info}{section_info}{score_info}\n"
-                f"   Text: \"{display_content}\""
-            )
-            sources_section += citation
+            citations.append(CITATION_TEMPLATE.format(
+                i=i,
+                filename=filename,
+                page_info=page_info,
+                section_info=section_info,
+                score_info=score_info,
+                display_content=display_content,
+            ))
         
-        return sources_section
+        return "\n\nSources Used:" + "".join(citations)
@@ -1,42 +1,73 @@
 from interface.base_datastore import BaseDatastore, SearchResult
 from interface.base_retriever import BaseRetriever
-from typing import List
+from util.http_client import get_http_client
+from typing import List, Optional, Tuple
 from dotenv import load_dotenv
+from functools import lru_cache
+import logging
 import cohere
 import os
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 class Retriever(BaseRetriever):
-    def __init__(self, datastore: BaseDatastore):
+    def __init__(self, datastore: BaseDatastore, rerank_skip_gap: float = 0.05):
         self.datastore = datastore
+        # Skip re-ranking when the first-stage cosine scores already separate the top_k by this much.
+        self.rerank_skip_gap = rerank_skip_gap
+        # The Cohere client is created on first rerank, so commands that never rerank don't need CO_API_KEY.
+        self._cohere: Optional[cohere.ClientV2] = None
+        # Memoize rerank responses per instance, so retried queries don't call Cohere again.
+        self._cohere_rerank = lru_cache(maxsize=256)(self._cohere_rerank)
+
+    @property
+    def cohere_client(self) -> cohere.ClientV2:
+        if self._cohere is None:
+            self._cohere = cohere.ClientV2(api_key=os.getenv("CO_API_KEY"), httpx_client=get_http_client())
+        return self._cohere
 
     def search(self, query: str, top_k: int = 3) -> List[SearchResult]:
         search_results = self.datastore.search(query, top_k=top_k * 3)
+        if self._is_confident(search_results, top_k):
+            print("✅ Skipped reranking, first-stage scores are well separated")
+            return search_results[:top_k]
         reranked_results = self._rerank(query, search_results, top_k=top_k)
         return reranked_results
 
+    def _is_confident(self, search_results: List[SearchResult], top_k: int) -> bool:
+        """Whether the gap between the last kept and the first dropped result is large enough to trust."""
+        if top_k <= 0 or len(search_results) <= top_k:
+            return False
+        gap = search_results[top_k - 1].relevance_score - search_results[top_k].relevance_score
+        return gap > self.rerank_skip_gap
+
     def _rerank(self, query: str, search_results: List[SearchResult], top_k: int = 10) -> List[SearchResult]:
-        co = cohere.ClientV2(api_key=os.getenv("CO_API_KEY"))
-        
         # Extract content for reranking
-        documents = [result.content for result in search_results]
+        documents = tuple(result.content for result in search_results)
+        
+        response = self._cohere_rerank(query, documents, top_k)
+
+        # Update relevance scores from Cohere and return reranked SearchResult objects
+        reranked_results = [
+            self._apply_score(search_results[result.index], result.relevance_score)
+            for result in response.results
+        ]
         
-        response = co.rerank(
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("Reranked Indices: %s", [result.index for result in response.results])
+        return reranked_results
+
+    @staticmethod
+    def _apply_score(search_result: SearchResult, relevance_score: float) -> SearchResult:
+        search_result.relevance_score = relevance_score
+        return search_result
+
+    def _cohere_rerank(self, query: str, documents: Tuple[str, ...], top_k: int) -> cohere.V2RerankResponse:
+        return self.cohere_client.rerank(
             model="rerank-v3.5",
             query=query,
-            documents=documents,
+            documents=list(documents),
             top_n=top_k,
         )
-
-        # Update relevance scores and return reranked SearchResult objects
-        reranked_results = []
-        for result in response.results:
-            search_result = search_results[result.index]
-            # Update relevance score from Cohere
-            search_result.relevance_score = result.relevance_score
-            reranked_results.append(search_result)
-        
-        result_indices = [result.index for result in response.results]
-        print(f"✅ Reranked Indices: {result_indices}")
-        return reranked_results
@@ -0,0 +1,15 @@
+import httpx
+from functools import lru_cache
+
+# Connection pool settings shared by every API client.
+HTTP_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64)
+HTTP_TIMEOUT = httpx.Timeout(60.0, connect=5.0)
+
+
+@lru_cache(maxsize=None)
+def get_http_client() -> httpx.Client:
+    """
+    Shared HTTP/2 client, so concurrent API calls are multiplexed over kept-alive
+    connections instead of each client opening (and TLS handshaking) its own.
+    """
+    return httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=HTTP_TIMEOUT)
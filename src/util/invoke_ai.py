@@ -4,25 +4,46 @@ from pathlib import Path
 from dotenv import load_dotenv
 from openai import AzureOpenAI
 from cerebras.cloud.sdk import Cerebras
+from util.http_client import get_http_client
 
 load_dotenv()
 
+PROJECT_ROOT = Path(__file__).parent.parent.parent
+CONFIG_PATH = PROJECT_ROOT / "config.yml"
+
+# Use the libyaml C parser when PyYAML was built with it.
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# Parsed config.yml, re-read only when the file's modification time changes.
+_CFG_CACHE: dict = {}
+
+# Clients are reused across calls so that their HTTP connection pools are too.
+_CLIENTS = {}
+
+def _load_config() -> dict:
+    """Load config.yml, reusing the cached parse while the file is unchanged."""
+    try:
+        mtime = CONFIG_PATH.stat().st_mtime
+    except FileNotFoundError:
+        raise FileNotFoundError(f"Configuration file not found at {CONFIG_PATH}")
+
+    if _CFG_CACHE.get("mtime") != mtime:
+        try:
+            with open(CONFIG_PATH, 'r') as f:
+                config = yaml.load(f, Loader=_YAML_LOADER)
+        except yaml.YAMLError as e:
+            raise ValueError(f"Error parsing configuration file: {e}")
+        _CFG_CACHE.update(mtime=mtime, config=config)
+        # Clients were built from the previous config, so rebuild them on next use.
+        _CLIENTS.clear()
+    return _CFG_CACHE["config"]
+
 def invoke_ai(system_message: str, user_message: str) -> str:
     """
     Generic function to invoke an AI model given a system and user message.
     Supports both Azure OpenAI and Cerebras platforms based on config.yml.
     """
-    # Load configuration from config.yml
-    project_root = Path(__file__).parent.parent.parent
-    config_path = project_root / "config.yml"
-    
-    try:
-        with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
-    except FileNotFoundError:
-        raise FileNotFoundError(f"Configuration file not found at {config_path}")
-    except yaml.YAMLError as e:
-        raise ValueError(f"Error parsing configuration file: {e}")
+    config = _load_config()
     
     # Get configuration values
     provider = config.get('ai_platform', {}).get('provider')
@@ -47,12 +68,15 @@ def invoke_ai(system_message: str, user_message: str) -> str:
         if not azure_config:
             raise ValueError("Azure OpenAI configuration not found")
             
-        client = AzureOpenAI(
-            azure_deployment=azure_config.get('azure_deployment'),
-            api_version=azure_config.get('api_version'),
-            api_key=os.getenv("AZURE_OPENAI_API_KEY2"),
-            azure_endpoint=azure_config.get('azure_endpoint')
-        )
+        client = _CLIENTS.get(provider)
+        if client is None:
+            client = _CLIENTS[provider] = AzureOpenAI(
+                azure_deployment=azure_config.get('azure_deployment'),
+                api_version=azure_config.get('api_version'),
+                api_key=os.getenv("AZURE_OPENAI_API_KEY2"),
+                azure_endpoint=azure_config.get('azure_endpoint'),
+                http_client=get_http_client(),
+            )
         
         response = client.chat.completions.create(
             model=azure_config.get('model'),
@@ -68,7 +92,12 @@ def invoke_ai(system_message: str, user_message: str) -> str:
         if not cerebras_config:
             raise ValueError("Cerebras configuration not found")
             
-        client = Cerebras(api_key=os.getenv("CEREBRAS_API_KEY"))
+        client = _CLIENTS.get(provider)
+        if client is None:
+            client = _CLIENTS[provider] = Cerebras(
+                api_key=os.getenv("CEREBRAS_API_KEY"),
+                http_client=get_http_client(),
+            )
         
         response = client.chat.completions.create(
             messages=messages,
@@ -0,0 +1,72 @@
+import os
+import functools
+from itertools import islice
+from typing import Any, Callable, Iterator
+from pydantic import PrivateAttr
+from docling_core.transforms.chunker.tokenizer.openai import OpenAITokenizer
+
+# Long texts are tokenized in windows of about this many characters, so peak memory stays bounded.
+WINDOW_CHARS = 32 * 1024
+# Threads used by tiktoken's native batch encoder, which runs outside the GIL.
+NUM_THREADS = os.cpu_count() or 1
+# The chunker re-counts the same texts while merging chunks, so the most recent counts of texts up to one
+# window long are memoized. Workers keep their chunker across documents, so the cache stays small.
+TOKEN_COUNT_CACHE_SIZE = 2048
+
+
+def _is_boundary(text: str, newline: int) -> bool:
+    # No pattern of the cl100k/o200k pre-tokenizers matches across a newline followed by a letter or digit,
+    # so the texts on either side of it tokenize exactly as they do within the whole text.
+    return text[newline + 1:newline + 2].isalnum()
+
+
+def _split_point(text: str, start: int, window: int) -> int:
+    """Index just past the last boundary within the window, else past the first one after it, else the end of text."""
+    end = start + window
+    newline = text.rfind("\n", start, end)
+    while newline != -1:
+        if _is_boundary(text, newline):
+            return newline + 1
+        newline = text.rfind("\n", start, newline)
+    newline = text.find("\n", end)
+    while newline != -1:
+        if _is_boundary(text, newline):
+            return newline + 1
+        newline = text.find("\n", newline + 1)
+    return len(text)
+
+
+def iter_windows(text: str, window: int = WINDOW_CHARS) -> Iterator[str]:
+    """Yield consecutive slices of `text`, of about `window` characters, whose token counts add up to the text's."""
+    start = 0
+    while start < len(text):
+        end = _split_point(text, start, window) if len(text) - start > window else len(text)
+        yield text[start:end]
+        start = end
+
+
+class StreamingOpenAITokenizer(OpenAITokenizer):
+    """OpenAI tokenizer that counts tokens of long texts window by window instead of in one pass."""
+
+    _count_short_tokens: Callable[[str], int] = PrivateAttr()
+
+    def model_post_init(self, context: Any) -> None:
+        super().model_post_init(context)
+        self._count_short_tokens = functools.lru_cache(maxsize=TOKEN_COUNT_CACHE_SIZE)(self._encode_count)
+
+    def count_tokens(self, text: str) -> int:
+        # Nearly every text the chunker counts is a single window, encoded in one call rather than batched.
+        if len(text) <= WINDOW_CHARS:
+            return self._count_short_tokens(text)
+        return self._count_long_tokens(text)
+
+    def _encode_count(self, text: str) -> int:
+        return len(self.tokenizer.encode_ordinary(text))
+
+    def _count_long_tokens(self, text: str) -> int:
+        # Encode a group of windows at a time across threads, keeping only one group in memory.
+        count = 0
+        windows = iter_windows(text)
+        while group := list(islice(windows, NUM_THREADS)):
+            count += sum(map(len, self.tokenizer.encode_ordinary_batch(group, num_threads=NUM_THREADS)))
+        return count
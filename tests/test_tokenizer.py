@@ -0,0 +1,39 @@
+import sys
+from pathlib import Path
+
+import tiktoken
+
+# Add the src directory to Python's search path
+sys.path.append(str(Path(__file__).parent.parent / "src"))
+
+from util.tokenizer import WINDOW_CHARS, StreamingOpenAITokenizer, iter_windows
+
+ENCODING = tiktoken.encoding_for_model("gpt-4o")
+
+# Newlines next to whitespace, punctuation, slashes, digits and non-ASCII letters, where tokens could span a split.
+PARAGRAPH = (
+    "Heading 1.2\n\nSome text, with punctuation!\n/path/to/file\n  indented line\r\n"
+    "12345 numbers\nélève café 日本語\n.\n\n\n"
+    "trailing spaces   \nwords's they'll\t\ttabs\n"
+)
+
+
+def test_windows_cover_text():
+    text = PARAGRAPH * 50
+    windows = list(iter_windows(text, window=64))
+    assert len(windows) > 1
+    assert "".join(windows) == text
+
+
+def test_window_counts_add_up():
+    text = PARAGRAPH * 50
+    counts = sum(len(ENCODING.encode_ordinary(window)) for window in iter_windows(text, window=64))
+    assert counts == len(ENCODING.encode_ordinary(text))
+
+
+def test_count_tokens_matches_encode_ordinary():
+    tokenizer = StreamingOpenAITokenizer(tokenizer=ENCODING, max_tokens=128 * 1024)
+    text = PARAGRAPH * (3 * WINDOW_CHARS // len(PARAGRAPH))
+    assert len(list(iter_windows(text))) > 1
+    assert tokenizer.count_tokens(text) == len(ENCODING.encode_ordinary(text))
+    assert tokenizer.count_tokens(PARAGRAPH) == len(ENCODING.encode_ordinary(PARAGRAPH))